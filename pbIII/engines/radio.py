@@ -1,3 +1,5 @@
+import random
+
 import pyo
 
 from mutools import synthesis
@@ -39,11 +41,11 @@ class RadioEngine(synthesis.BasedCsoundEngine):
         if not isinstance(release_duration, infit.InfIt):
             release_duration = infit.Value(release_duration)
 
-        import random as random_module
-
-        random_module.seed(random_seed)
+        # seeds the global state, so that random attack and release durations
+        # are deterministic, too
+        random.seed(random_seed)
 
-        self.__random_module = random_module
+        self.__random_module = random
 
         voice.delay = rhy.Compound(voice.delay).stretch(tempo_factor)
         voice.dur = rhy.Compound(voice.dur).stretch(tempo_factor)
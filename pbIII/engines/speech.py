@@ -1,7 +1,12 @@
+import bisect
+import concurrent.futures
+import functools
+import itertools
 import operator
 import os
-
-import natsort
+import random
+import re
+import struct
 
 from mu.utils import activity_levels
 from mu.utils import infit
@@ -32,6 +37,77 @@ Different engines include:
 """
 
 
+_NATURAL_KEY = re.compile(r"(\d+)")
+
+
+def _natural_key(name: str) -> list:
+    return [int(t) if t.isdigit() else t for t in _NATURAL_KEY.split(name)]
+
+
+_WAVE_FORMATS_PCM_FLOAT = (1, 3)
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+# the sub format of WAVE_FORMAT_EXTENSIBLE is a GUID that starts with the format
+# code and always ends with these bytes
+_WAVE_SUBFORMAT_GUID_TAIL = bytes.fromhex("000000001000800000aa00389b71")
+
+
+def _read_wav_duration(path: str) -> float:
+    """Read the duration of a RIFF/WAVE file from its chunk headers."""
+    with open(path, "rb") as f:
+        riff, _, wave = struct.unpack("<4sI4s", f.read(12))
+        if riff != b"RIFF" or wave != b"WAVE":
+            raise ValueError("{} isn't a RIFF/WAVE file.".format(path))
+
+        samplerate, block_align = None, None
+        while True:
+            chunk_id, chunk_size = struct.unpack("<4sI", f.read(8))
+            # chunks are padded to an even size
+            padded_chunk_size = chunk_size + (chunk_size & 1)
+            if chunk_id == b"fmt ":
+                fmt = f.read(padded_chunk_size)
+                audio_format, _, samplerate, _, block_align = struct.unpack(
+                    "<HHIIH", fmt[:14]
+                )
+                if audio_format == _WAVE_FORMAT_EXTENSIBLE:
+                    subformat = fmt[24:40]
+                    if subformat[2:] != _WAVE_SUBFORMAT_GUID_TAIL:
+                        raise ValueError("{} has an unknown subformat.".format(path))
+                    audio_format = struct.unpack("<H", subformat[:2])[0]
+                # for compressed formats block_align isn't the size of a frame
+                if audio_format not in _WAVE_FORMATS_PCM_FLOAT:
+                    raise ValueError("{} isn't PCM or float.".format(path))
+            elif chunk_id == b"data":
+                if not samplerate or not block_align:
+                    raise ValueError("{} has no valid fmt chunk.".format(path))
+                # streamed files don't know the size of their data chunk
+                if chunk_size in (0, 0xFFFFFFFF):
+                    raise ValueError("{} has no valid data size.".format(path))
+                # truncated files can't be longer than what is left
+                chunk_size = min(chunk_size, os.fstat(f.fileno()).st_size - f.tell())
+                return (chunk_size // block_align) / samplerate
+            else:
+                f.seek(padded_chunk_size, 1)
+
+
+@functools.lru_cache(maxsize=None)
+def _sndduration(path: str) -> float:
+    try:
+        return _read_wav_duration(path)
+    # fall back to libsndfile for anything that isn't a plain wav file
+    except (ValueError, struct.error):
+        return synthesis.pyo.sndinfo(path)[1]
+
+
+@functools.lru_cache(maxsize=256)
+def _sndtable(path: str) -> synthesis.pyo.SndTable:
+    return synthesis.pyo.SndTable(path)
+
+
+def _draw(maker: infit.InfIt, n: int) -> tuple:
+    """Return the next n values of an infit object."""
+    return tuple(map(next, itertools.repeat(maker, n)))
+
+
 class SlicePlayer(synthesis.pyo.EventInstrument):
     fadein = 0.02
     fadeout = 0.03
@@ -47,6 +123,7 @@ class SlicePlayer(synthesis.pyo.EventInstrument):
             "distortion_lv",
             "noise_lv",
             "lorenz_lv",
+            "chenlee_lv",
         )
         attributes_to_set_n = (
             ("lv", 1),
@@ -71,48 +148,63 @@ class SlicePlayer(synthesis.pyo.EventInstrument):
         )
         fade *= float(self.lv)
 
+        # only effects that are active in this event get their own pyo objects
         if self.path is not None:
             self.osc = SlicePlayer.make_osc(self.path, mul=fade).play(dur=self.dur)
-            self.original = SlicePlayer.make_osc(
-                self.path, mul=fade * self.original_lv
-            ).out(1, dur=self.dur)
-            self.h = synthesis.pyo.Harmonizer(
-                self.osc, transpo=self.h_transpo, mul=self.harmonizer_lv
-            ).out(1)
-            self.filtered = synthesis.pyo.Reson(
-                self.osc, freq=self.filter_freq, q=self.filter_q, mul=self.filter_lv
-            ).out(1)
-            self.distr = synthesis.pyo.Disto(self.osc, mul=self.distortion_lv).out(1)
-            self.rm = (
-                synthesis.pyo.Sine(self.rm_freq) * self.osc * self.ringmodulation_lv
-            ).out(1)
+            if self.original_lv:
+                self.original = (self.osc * self.original_lv).out(1, dur=self.dur)
+            if self.harmonizer_lv:
+                self.h = synthesis.pyo.Harmonizer(
+                    self.osc, transpo=self.h_transpo, mul=self.harmonizer_lv
+                ).out(1)
+            if self.filter_lv:
+                self.filtered = synthesis.pyo.Reson(
+                    self.osc, freq=self.filter_freq, q=self.filter_q, mul=self.filter_lv
+                ).out(1)
+            if self.distortion_lv:
+                self.distr = synthesis.pyo.Disto(self.osc, mul=self.distortion_lv).out(
+                    1
+                )
+            if self.ringmodulation_lv:
+                self.rm = (
+                    synthesis.pyo.Sine(self.rm_freq) * self.osc * self.ringmodulation_lv
+                ).out(1)
 
         # ambient noise
+        noise_generators = []
         noise_dur = self.dur + self.fadein + self.fadeout
-        self.noise_fader = synthesis.pyo.Linseg(
-            [(0, self.ambient_noise_lv[0]), (self.dur, self.ambient_noise_lv[1])]
-        ).play(dur=noise_dur)
-
-        self.lorenz = synthesis.pyo.Lorenz(
-            pitch=self.lorenz_pitch, chaos=self.lorenz_chaos, mul=self.lorenz_lv
-        ).play(dur=noise_dur)
-
-        self.brown = synthesis.pyo.BrownNoise(mul=self.noise_lv).play(dur=noise_dur)
 
-        self.ambient_noise = ((self.brown + self.lorenz) * self.noise_fader * fade).out(
-            1
-        )
+        if self.lorenz_lv:
+            self.lorenz = synthesis.pyo.Lorenz(
+                pitch=self.lorenz_pitch, chaos=self.lorenz_chaos, mul=self.lorenz_lv
+            ).play(dur=noise_dur)
+            noise_generators.append(self.lorenz)
+
+        if self.noise_lv:
+            self.brown = synthesis.pyo.BrownNoise(mul=self.noise_lv).play(dur=noise_dur)
+            noise_generators.append(self.brown)
+
+        if noise_generators:
+            self.noise_fader = synthesis.pyo.Linseg(
+                [(0, self.ambient_noise_lv[0]), (self.dur, self.ambient_noise_lv[1])]
+            ).play(dur=noise_dur)
+            self.ambient_noise = (
+                functools.reduce(operator.add, noise_generators)
+                * self.noise_fader
+                * fade
+            ).out(1)
 
         # additional noise similar to sounds generated by natural radio, I love it!
-        self.disturbance = synthesis.pyo.ChenLee(
-            pitch=self.chenlee_pitch,
-            chaos=self.chenlee_chaos,
-            mul=fade * self.chenlee_lv,
-        ).out(1)
+        if self.chenlee_lv:
+            self.disturbance = synthesis.pyo.ChenLee(
+                pitch=self.chenlee_pitch,
+                chaos=self.chenlee_chaos,
+                mul=fade * self.chenlee_lv,
+            ).out(1)
 
     @staticmethod
     def make_osc(path: str, mul=1) -> synthesis.pyo.Osc:
-        soundfile = synthesis.pyo.SndTable(path)
+        soundfile = _sndtable(path)
         return synthesis.pyo.Osc(soundfile, freq=soundfile.getRate(), interp=4, mul=mul)
 
 
@@ -161,6 +253,8 @@ class BrokenRadio(synthesis.PyoEngine):
         chenlee_pitch_maker: infit.InfIt = infit.Cycle((0.5, 0.75, 0.66)),
         lorenz_chaos_maker: infit.InfIt = infit.Cycle((0.5, 0.7, 0.6)),
         lorenz_pitch_maker: infit.InfIt = infit.Cycle((0.5, 0.6, 0.55)),
+        path_per_source: tuple = None,
+        duration_per_source: tuple = None,
     ) -> None:
 
         super().__init__()
@@ -181,6 +275,7 @@ class BrokenRadio(synthesis.PyoEngine):
         self.skip_n_samples_per_source = skip_n_samples_per_source
         self.volume = volume
         self.curve = curve
+        self._curve_cache = {}
         self.__duration = duration
         self.source_decider = source_decider
         self.filter_q_maker = filter_q_maker
@@ -202,10 +297,20 @@ class BrokenRadio(synthesis.PyoEngine):
         self.level_per_effect = level_per_effect
         self.activity_lv_per_effect = activity_lv_per_effect
 
-        self.path_per_source = BrokenRadio.detect_files(
-            self.sources, order_per_source, skip_n_samples_per_source
-        )
-        self.data_per_source = BrokenRadio.detect_data_per_source(self.path_per_source)
+        # copies of the same engine can reuse already detected files & durations
+        if path_per_source is None:
+            path_per_source = BrokenRadio.detect_files(
+                self.sources, order_per_source, skip_n_samples_per_source
+            )
+            duration_per_source = None
+
+        if duration_per_source is None:
+            duration_per_source = BrokenRadio.detect_duration_per_source(
+                path_per_source
+            )
+
+        self.path_per_source = path_per_source
+        self.duration_per_source = duration_per_source
         self.activity_object_per_effect = {
             effect: activity_levels.ActivityLevel() for effect in self.__effects
         }
@@ -217,6 +322,11 @@ class BrokenRadio(synthesis.PyoEngine):
         else:
             raise ValueError("Unknown interlocking: {}.".format(interlocking))
 
+        # seeds the global state, so that random infit objects (source_decider
+        # and pause_per_event) are deterministic, no matter if the files have
+        # been detected or have been passed by copy
+        random.seed(10)
+
         if interlocking == "parallel":
             self.sample_key_per_event = tuple(
                 (next(self.source_decider), idx) for idx in range(self.maxima_n_events)
@@ -234,9 +344,8 @@ class BrokenRadio(synthesis.PyoEngine):
             self.path_per_source[source_idx][sample_idx]
             for source_idx, sample_idx in self.sample_key_per_event
         )
-        ig1 = operator.itemgetter(1)
         self.duration_per_sample = tuple(
-            ig1(self.data_per_source[source_idx][sample_idx])
+            self.duration_per_source[source_idx][sample_idx]
             for source_idx, sample_idx in self.sample_key_per_event
         )
 
@@ -253,6 +362,13 @@ class BrokenRadio(synthesis.PyoEngine):
             )
             raise ValueError(msg)
 
+        self.absolute_time_per_event = tools.accumulate_from_zero(
+            self.duration_per_event
+        )
+        self.prepare(
+            BrokenRadio.find_n_events(self.duration, self.absolute_time_per_event)
+        )
+
     def copy(self) -> "BrokenRadio":
         return type(self)(
             self.sources,
@@ -274,19 +390,37 @@ class BrokenRadio(synthesis.PyoEngine):
             self.chenlee_pitch_maker,
             self.lorenz_chaos_maker,
             self.lorenz_pitch_maker,
+            self.path_per_source,
+            self.duration_per_source,
         )
 
     @property
     def duration(self) -> float:
         return self.__duration
 
+    @staticmethod
+    def find_n_events(duration: float, absolute_time_per_event: tuple) -> int:
+        """Return index of the event start that is closest to duration.
+
+        Since absolute_time_per_event is monotonically increasing a binary
+        search is sufficient.
+        """
+        idx = bisect.bisect_left(absolute_time_per_event, duration)
+        if idx == len(absolute_time_per_event):
+            return idx - 1
+        elif idx == 0:
+            return idx
+
+        previous, following = absolute_time_per_event[idx - 1 : idx + 1]
+        if duration - previous < following - duration:
+            return idx - 1
+        return idx
+
     @staticmethod
     def detect_files(
         sources: tuple, order_per_source: tuple, skip_n_samples_per_source: tuple
     ) -> tuple:
-        import random as random_shuffle
-
-        random_shuffle.seed(10)
+        random.seed(10)
 
         files_per_source = []
         for path, order, skip_n_samples in zip(
@@ -299,104 +433,128 @@ class BrokenRadio(synthesis.PyoEngine):
                 msg = "Unknown order: {}.".format(order)
                 raise ValueError(msg)
 
-            all_files = natsort.natsorted(os.listdir(path))[skip_n_samples:]
+            with os.scandir(path) as entries:
+                soundfiles = [
+                    e.name for e in entries if e.is_file() and e.name.endswith("wav")
+                ]
+
+            all_files = sorted(soundfiles, key=_natural_key)[skip_n_samples:]
 
             if order == "reverse":
                 all_files = tuple(reversed(all_files))
             elif order == "shuffle":
                 all_files = list(all_files)
-                random_shuffle.shuffle(all_files)
+                random.shuffle(all_files)
                 all_files = tuple(all_files)
 
-            soundfiles = filter(lambda f: f.endswith("wav"), all_files)
-            files_per_source.append(tuple(path + f for f in soundfiles))
+            files_per_source.append(tuple(os.path.join(path, f) for f in all_files))
 
         return tuple(files_per_source)
 
     @staticmethod
-    def detect_data_per_source(path_per_source: tuple) -> tuple:
-        return tuple(
-            tuple(synthesis.pyo.sndinfo(path) for path in source)
-            for source in path_per_source
-        )
+    def detect_duration_per_source(path_per_source: tuple) -> tuple:
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            return tuple(
+                tuple(executor.map(_sndduration, map(os.path.abspath, source)))
+                for source in path_per_source
+            )
 
     @staticmethod
     def convert_sample_names2pyo_objects(path: str, files: tuple) -> tuple:
-        return tuple(synthesis.pyo.SndTable(path + f) for f in files)
+        return tuple(_sndtable(os.path.join(path, f)) for f in files)
 
-    def render(self, name: str) -> None:
-        self.server.recordOptions(
-            dur=self.duration, filename="{}.wav".format(name), sampletype=4
+    @staticmethod
+    def mk_lv_per_event(
+        activity_object: activity_levels.ActivityLevel,
+        activity_lv: int,
+        level: infit.InfIt,
+        n_events: int,
+    ) -> tuple:
+        is_active_per_event = tuple(
+            map(activity_object, itertools.repeat(activity_lv, n_events))
+        )
+        return tuple(
+            next(level) if is_active else 0 for is_active in is_active_per_event
         )
 
-        import random as random_ambient_noise_lv
+    def prepare(self, n_events: int) -> None:
+        """Draw all attributes for the first n_events slices.
 
-        random_ambient_noise_lv.seed(1)
+        The drawing happens in advance, so that render hasn't to
+        iterate through any infit objects before starting the server.
+        Since prepare gets called at initialisation, infit objects that are
+        shared between different BrokenRadio objects (for instance the
+        default makers) advance in the order in which the engines are
+        initialised and not in the order in which they are rendered.
+        The draws are seeded, but the global random state gets restored
+        afterwards, so that code running after the initialisation isn't
+        affected by them.
+        """
 
-        n_events = tools.find_closest_index(
-            self.duration, tools.accumulate_from_zero(self.duration_per_event)
-        )
+        try:
+            assert n_events <= len(self.duration_per_event)
+        except AssertionError:
+            msg = "Only {} events available, but {} events requested.".format(
+                len(self.duration_per_event), n_events
+            )
+            raise ValueError(msg)
 
+        self.n_events = n_events
+
+        # seeds the global state, so that the random infit objects
+        # (Gaussian, Uniform, ...) that are used for drawing are deterministic, too
+        random_state = random.getstate()
+        random.seed(1)
+        try:
+            self.attributes_per_event = self.__mk_attributes_per_event(n_events)
+        finally:
+            random.setstate(random_state)
+
+    def __mk_attributes_per_event(self, n_events: int) -> dict:
         duration_per_event = self.duration_per_event[:n_events]
         sample_path_per_event = self.sample_path_per_event[:n_events]
 
         lv_per_effect = {
-            "{}_lv".format(effect): tuple(
-                next(self.level_per_effect[effect])
-                if self.activity_object_per_effect[effect](
-                    self.activity_lv_per_effect[effect]
-                )
-                else 0
-                for i in duration_per_event
+            "{}_lv".format(effect): BrokenRadio.mk_lv_per_event(
+                self.activity_object_per_effect[effect],
+                self.activity_lv_per_effect[effect],
+                self.level_per_effect[effect],
+                n_events,
             )
             for effect in self.__effects
         }
 
         ambient_noise_lv_per_event = tuple(
-            random_ambient_noise_lv.uniform(0.2, 0.4) for i in duration_per_event
+            random.uniform(0.2, 0.4) for i in duration_per_event
         )
         ambient_noise_lv_per_event = tuple(
-            (a, b)
-            for a, b in zip(
-                (0,) + ambient_noise_lv_per_event, ambient_noise_lv_per_event
-            )
+            zip((0,) + ambient_noise_lv_per_event, ambient_noise_lv_per_event)
         )
 
         # general dynamic level for each slice
-        event_lv = tuple(self.volume * lv for lv in self.curve(n_events, "points"))
+        if n_events not in self._curve_cache:
+            self._curve_cache.update({n_events: tuple(self.curve(n_events, "points"))})
+        event_lv = tuple(self.volume * lv for lv in self._curve_cache[n_events])
 
         ################################################################
 
         # controlling different dsp parameter
-        filter_freq_per_event = tuple(
-            next(self.filter_freq_maker) for i in duration_per_event
-        )
-        filter_q_per_event = tuple(
-            next(self.filter_q_maker) for i in duration_per_event
-        )
+        filter_freq_per_event = _draw(self.filter_freq_maker, n_events)
+        filter_q_per_event = _draw(self.filter_q_maker, n_events)
 
-        rm_freq_per_event = tuple(next(self.rm_freq_maker) for i in duration_per_event)
+        rm_freq_per_event = _draw(self.rm_freq_maker, n_events)
 
-        transpo_per_event = tuple(next(self.transpo_maker) for i in duration_per_event)
+        transpo_per_event = _draw(self.transpo_maker, n_events)
 
-        chenlee_chaos_per_event = tuple(
-            next(self.chenlee_chaos_maker) for i in duration_per_event
-        )
-        chenlee_pitch_per_event = tuple(
-            next(self.chenlee_pitch_maker) for i in duration_per_event
-        )
+        chenlee_chaos_per_event = _draw(self.chenlee_chaos_maker, n_events)
+        chenlee_pitch_per_event = _draw(self.chenlee_pitch_maker, n_events)
 
-        lorenz_chaos_per_event = tuple(
-            next(self.lorenz_chaos_maker) for i in duration_per_event
-        )
-        lorenz_pitch_per_event = tuple(
-            next(self.lorenz_pitch_maker) for i in duration_per_event
-        )
+        lorenz_chaos_per_event = _draw(self.lorenz_chaos_maker, n_events)
+        lorenz_pitch_per_event = _draw(self.lorenz_pitch_maker, n_events)
 
         ################################################################
 
-        e = synthesis.pyo.Events(
-            instr=SlicePlayer,
+        return dict(
             path=sample_path_per_event,
             dur=duration_per_event,
             lv=event_lv,
@@ -411,6 +569,16 @@ class BrokenRadio(synthesis.PyoEngine):
             ambient_noise_lv=ambient_noise_lv_per_event,
             **lv_per_effect,
         )
+
+    def render(self, name: str) -> None:
+        self.server.recordOptions(
+            dur=self.duration, filename="{}.wav".format(name), sampletype=4
+        )
+
+        # tables are only shared between events of the same render
+        _sndtable.cache_clear()
+
+        e = synthesis.pyo.Events(instr=SlicePlayer, **self.attributes_per_event)
         e.play()
 
         self.server.start()
@@ -1,5 +1,4 @@
 import functools
-import itertools
 import operator
 
 from mu.mel import ji
@@ -7,6 +6,8 @@ from mu.sco import old
 
 
 class Fake(object):
+    __slots__ = ("__n", "__m", "__mother")
+
     def __init__(self, m: tuple, n: tuple, mother: tuple) -> None:
         self.__n = n
         self.__m = m
@@ -19,6 +20,11 @@ class Fake(object):
             p = p.inverse()
         return p
 
+    @property
+    def key(self) -> tuple:
+        """Fakes with equal keys convert to equal pitches."""
+        return (tuple(self.__m), tuple(self.__n) if self.__n else ())
+
     @property
     def is_fake(self) -> bool:
         return bool(self.__n)
@@ -31,46 +37,57 @@ class Fake(object):
         else:
             assert lenm >= 2
 
-        combinations = sorted(
-            itertools.combinations(self.__m, lenm - 1),
-            reverse=True,
-            key=lambda x: sum(x),
-        )
+        # dropping the smallest prime leaves the combination with the highest sum
+        m = tuple(self.__m)
+        order = sorted(reversed(range(lenm)), key=m.__getitem__)
+        combinations = tuple(m[:idx] + m[idx + 1 :] for idx in order)
 
         data = tuple(Fake(item, self.__n, self.__m) for item in combinations)
 
         if not self.is_fake and add_fake:
             additional = Fake(
-                self.__m, [p for p in self.__mother if p not in self.__m], self.__m
+                self.__m, [p for p in self.__mother if p not in m], self.__m
             )
             data += (additional,)
 
         return data
 
 
+@functools.lru_cache(maxsize=None)
+def _mk_voices(primes: tuple, fake_fakes: bool) -> tuple:
+    lenp = len(primes)
+    voices = [Fake(primes, None, primes).clone(add_fake=False)]
+    voices += [[] for i in range(lenp - 2)]
+    for nvox in range(len(voices) - 1):
+        for fk in voices[nvox]:
+            condition2clone = (not fk.is_fake, fk.is_fake and fake_fakes)
+            if any(condition2clone):
+                voices[nvox + 1].extend(fk.clone())
+    return tuple(tuple(vox) for vox in voices)
+
+
 class Factory(object):
     def __init__(self, primes: tuple, fake_fakes: bool = False) -> None:
-        lenp = len(primes)
-        voices = [Fake(primes, None, primes).clone(add_fake=False)]
-        voices += [[] for i in range(lenp - 2)]
-        for nvox in range(len(voices) - 1):
-            for fk in voices[nvox]:
-                condition2clone = (not fk.is_fake, fk.is_fake and fake_fakes)
-                if any(condition2clone):
-                    voices[nvox + 1].extend(fk.clone())
-        self.voices = voices
+        # Fake objects are immutable, therefore they can be shared between
+        # different Factory objects with equal arguments
+        self.voices = [list(vox) for vox in _mk_voices(tuple(primes), fake_fakes)]
 
     def convert2voices(self, gender=True) -> tuple:
         len_voices = tuple(len(v) for v in self.voices)
         maxima = max(len_voices)
         rhythm_per_vox = [maxima // lv for lv in len_voices]
+
+        # the same fake can appear in different voices
+        pitch_per_key = {}
+        for vox in self.voices:
+            for f in vox:
+                if f.key not in pitch_per_key:
+                    pitch_per_key.update(
+                        {f.key: f.convert2pitch(gender=gender).normalize()}
+                    )
+
         return tuple(
-            old.Melody(
-                [
-                    old.Tone(f.convert2pitch(gender=gender).normalize(), rhythm)
-                    for f in vox
-                ]
-            )
+            old.Melody([old.Tone(pitch_per_key[f.key], rhythm) for f in vox])
             for vox, rhythm in zip(self.voices, rhythm_per_vox)
         )
 
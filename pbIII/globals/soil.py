@@ -1,6 +1,9 @@
+import concurrent.futures
 import functools
 import itertools
 import operator
+import os
+import subprocess
 
 from mu.mel import ji
 from mu.mel import mel
@@ -875,6 +878,27 @@ class JICounterpoint(object):
         return tuple(tuple(v) for v in voices)
 
 
+def export2wav_in_parallel(exports: tuple) -> None:
+    """Render (Pianoteq, name, preset) exports with at most cpu_count processes.
+
+    export2wav only starts the Pianoteq process, therefore each worker waits
+    for its process to finish before the next export gets started.
+    """
+
+    def export2wav(f, name: str, preset: str) -> None:
+        process = f.export2wav(name, preset=preset)
+        if process.wait() != 0:
+            raise subprocess.CalledProcessError(process.returncode, process.args)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        futures = tuple(
+            executor.submit(export2wav, f, name, preset) for f, name, preset in exports
+        )
+
+    for future in futures:
+        future.result()
+
+
 def simple_synthesis(melodies: tuple, make_diva=True):
     import random
 
@@ -882,6 +906,7 @@ def simple_synthesis(melodies: tuple, make_diva=True):
 
     import pyteq
 
+    exports = []
     for idx, voice in enumerate(melodies):
         # voice = old.Melody(voice[:120]).tie()
         voice = old.Melody(voice[:200])
@@ -920,15 +945,18 @@ def simple_synthesis(melodies: tuple, make_diva=True):
         f = pyteq.Pianoteq(
             melody_pteq, available_midi_notes=tuple(n for n in range(20, 125))
         )
-        f.export2wav(
-            "pianoteq_output/test{0}".format(idx), preset='"Concert Harp Daily"'
+        exports.append(
+            (f, "pianoteq_output/test{0}".format(idx), '"Concert Harp Daily"')
         )
-        # f.export2wav("test{0}".format(idx), preset='"Erard Player"')
+        # exports.append((f, "test{0}".format(idx), '"Erard Player"'))
+
+    export2wav_in_parallel(exports)
 
 
 def harmonic_synthesis(poly_per_interlocking: tuple):
     import pyteq
 
+    exports = []
     for poly_idx, poly in enumerate(poly_per_interlocking):
         for melody_idx, voice in enumerate(poly):
             voice = old.Melody(voice[:280])
@@ -949,8 +977,13 @@ def harmonic_synthesis(poly_per_interlocking: tuple):
             ]
             instr_range = tuple(n for n in range(10, 125))
             f = pyteq.Pianoteq(melody, available_midi_notes=instr_range)
-            f.export2wav(
-                "pianoteq_output/glitter_{0}_{1}".format(poly_idx, melody_idx),
-                # preset='"Kalimba Spacey"',
-                preset='"Celtic Harp Bright"',
+            exports.append(
+                (
+                    f,
+                    "pianoteq_output/glitter_{0}_{1}".format(poly_idx, melody_idx),
+                    # '"Kalimba Spacey"',
+                    '"Celtic Harp Bright"',
+                )
             )
+
+    export2wav_in_parallel(exports)